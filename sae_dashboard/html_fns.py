@@ -1,16 +1,27 @@
 import json
 import re
+from functools import cache
 from pathlib import Path
-from typing import Any
-
-from matplotlib import colors
+from typing import TYPE_CHECKING, Any
 
 from sae_dashboard.components_config import Column
 from sae_dashboard.utils_fns import apply_indent, deep_union
 
-BG_COLOR_MAP = colors.LinearSegmentedColormap.from_list(
-    "bg_color_map", ["white", "darkorange"]
-)
+if TYPE_CHECKING:
+    from matplotlib.colors import LinearSegmentedColormap
+
+
+@cache
+def get_bg_color_map() -> "LinearSegmentedColormap":
+    """
+    Returns the white -> darkorange colormap used by `bgColorMap`. It's built on first use,
+    so importing this module doesn't pull in matplotlib.
+    """
+    from matplotlib import colors
+
+    return colors.LinearSegmentedColormap.from_list(
+        "bg_color_map", ["white", "darkorange"]
+    )
 
 
 def bgColorMap(x: float):
@@ -21,8 +32,10 @@ def bgColorMap(x: float):
         1: darkorange
     """
     # assert min(x, 1-x) > -1e-6, f"Expected 0 <= x <= 1, but got {x}"
+    from matplotlib import colors
+
     x2 = max(0.0, min(1.0, x))
-    return colors.rgb2hex(BG_COLOR_MAP(x2))
+    return colors.rgb2hex(get_bg_color_map()(x2))
 
 
 def uColorMap(x: float) -> str:
@@ -1,4 +1,5 @@
 import json
+import re
 from typing import Any, Dict, List, Optional, Union
 
 import numpy as np
@@ -18,6 +19,32 @@ from sae_dashboard.neuronpedia.neuronpedia_runner_config import (
 from sae_dashboard.sae_vis_data import SaeVisData
 from sae_dashboard.vector_vis_data import VectorVisData
 
+# TODO: add more anomalies here
+HTML_ANOMALIES = {
+    "âĢĶ": "—",
+    "âĢĵ": "–",
+    "âĢľ": "“",
+    "âĢĿ": "”",
+    "âĢĺ": "‘",
+    "âĢĻ": "’",
+    "âĢĭ": " ",  # TODO: this is actually zero width space
+    "Ġ": " ",
+    "Ċ": "\n",
+    "ĉ": "\t",
+}
+# longest keys first so multi-char anomalies win over any shorter overlapping key
+_ANOMALY_RE = re.compile(
+    "|".join(re.escape(k) for k in sorted(HTML_ANOMALIES, key=len, reverse=True))
+)
+
+
+def clean_anomalies(token_str: str) -> str:
+    """Replace every HTML_ANOMALIES key in `token_str` in a single regex pass."""
+    # every anomaly contains a non-ascii char, so plain ascii tokens can skip the regex
+    if token_str.isascii():
+        return token_str
+    return _ANOMALY_RE.sub(lambda m: HTML_ANOMALIES[m.group(0)], token_str)
+
 
 class NpEncoder(json.JSONEncoder):
     def default(self, o: Any):
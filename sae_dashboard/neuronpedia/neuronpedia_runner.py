@@ -1,16 +1,24 @@
 import argparse
-import gc
+import hashlib
 import json
 import os
+import re
+import shutil
+import tempfile
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Set, Tuple
+from typing import Any, Dict, Generator
 
 import numpy as np
+import pyarrow as pa
 import torch
 import wandb
 import wandb.sdk
-from matplotlib import colors
+from datasets import Dataset, load_from_disk
+from sae_lens.config import DTYPE_MAP as DTYPES
 from sae_lens.sae import SAE
 from sae_lens.training.activations_store import ActivationsStore
 from tqdm import tqdm
@@ -28,37 +36,117 @@ from sae_dashboard.components_config import (
 
 # from sae_dashboard.data_writing_fns import save_feature_centric_vis
 from sae_dashboard.layout import SaeVisLayoutConfig
-from sae_dashboard.neuronpedia.neuronpedia_converter import NeuronpediaConverter
+from sae_dashboard.neuronpedia.neuronpedia_converter import (
+    NeuronpediaConverter,
+    clean_anomalies,
+)
 from sae_dashboard.neuronpedia.neuronpedia_runner_config import NeuronpediaRunnerConfig
-from sae_dashboard.sae_vis_data import SaeVisConfig
+from sae_dashboard.sae_vis_data import SaeVisConfig, SaeVisData
 from sae_dashboard.sae_vis_runner import SaeVisRunner
-from sae_dashboard.utils_fns import has_duplicate_rows
+from sae_dashboard.utils_fns import (
+    first_occurrence_mask,
+    has_duplicate_rows,
+    row_fingerprints,
+)
 
 # set TOKENIZERS_PARALLELISM to false to avoid warnings
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 RUN_SETTINGS_FILE = "run_settings.json"
+ALIVE_FEATURES_FILE = "alive_features.npy"
+# sha256 of the tokens the batch files in outputs_dir were generated from
+TOKENS_FINGERPRINT_FILE = "tokens_fingerprint.txt"
 OUT_OF_RANGE_TOKEN = "<|outofrange|>"
-
-BG_COLOR_MAP = colors.LinearSegmentedColormap.from_list(
-    "bg_color_map", ["white", "darkorange"]
-)
+# batch JSON is written in slices of this many characters, see _write_np_json
+JSON_WRITE_CHUNK_CHARS = 1 << 20
+# completed batches are reported to wandb in groups, whichever limit is hit first
+WANDB_LOG_EVERY_BATCHES = 50
+WANDB_LOG_EVERY_SECONDS = 30.0
 
 
 DEFAULT_FALLBACK_DEVICE = "cpu"
+SUPPORTED_DTYPE_OVERRIDES = ("float16", "float32", "bfloat16")
+REDUCED_PRECISION_DTYPES = (torch.float16, torch.bfloat16)
 
-# TODO: add more anomalies here
-HTML_ANOMALIES = {
-    "âĢĶ": "—",
-    "âĢĵ": "–",
-    "âĢľ": "“",
-    "âĢĿ": "”",
-    "âĢĺ": "‘",
-    "âĢĻ": "’",
-    "âĢĭ": " ",  # TODO: this is actually zero width space
-    "Ġ": " ",
-    "Ċ": "\n",
-    "ĉ": "\t",
-}
+
+def _resolve_dtype(dtype: str) -> torch.dtype | None:
+    """Map a config dtype string to a torch dtype. An empty string means no override."""
+    if dtype == "":
+        return None
+    if dtype not in SUPPORTED_DTYPE_OVERRIDES:
+        raise ValueError(
+            f"Unsupported dtype: {dtype}, we support {', '.join(SUPPORTED_DTYPE_OVERRIDES)}"
+        )
+    return DTYPES[dtype]
+
+
+def _module_is_on(module: torch.nn.Module, device: torch.device) -> bool:
+    """Whether every parameter of `module` already lives on `device`."""
+    if device.index is None and device.type != "cpu":
+        index = torch.cuda.current_device() if device.type == "cuda" else 0
+        device = torch.device(device.type, index)
+    return all(param.device == device for param in module.parameters())
+
+
+def _save_tokens(tokens: torch.Tensor, path: Path) -> bool:
+    """
+    Save a [batch seq] token tensor as an Arrow dataset. Written to a unique temporary
+    directory first, so an interrupted save never leaves something that looks complete
+    and concurrent runs never write into each other's files. Returns False, leaving the
+    existing dataset in place, if another run saved to `path` first.
+    """
+    tmp_path = Path(tempfile.mkdtemp(prefix=f".{path.name}.", dir=path.parent))
+    # build the fixed-size list column from the flat buffer; Dataset.from_dict would
+    # convert row by row, which is ~30x slower
+    tokens_np = tokens.cpu().numpy()
+    column = pa.FixedSizeListArray.from_arrays(
+        pa.array(tokens_np.ravel()), tokens_np.shape[1]
+    )
+    Dataset(pa.table({"tokens": column})).save_to_disk(str(tmp_path))
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if path.is_dir():
+            return False
+        raise
+    return True
+
+
+def _load_tokens(path: Path) -> torch.Tensor:
+    """Memory-map a token dataset saved by `_save_tokens` as a [batch seq] tensor."""
+    return load_from_disk(str(path)).with_format("torch")["tokens"]  # type: ignore
+
+
+def _tokens_fingerprint(tokens: torch.Tensor) -> str:
+    tokens_np = tokens.cpu().to(torch.long).contiguous().numpy()
+    digest = hashlib.sha256(str(tokens_np.shape).encode())
+    digest.update(tokens_np.tobytes())
+    return digest.hexdigest()
+
+
+def _write_np_json(
+    model: HookedTransformer,
+    feature_data: SaeVisData,
+    cfg: NeuronpediaRunnerConfig,
+    vocab_dict: Dict[int, str],
+    output_file: Path,
+) -> None:
+    """
+    Convert one batch of SaeVisRunner output to Neuronpedia JSON and write it. Runs on the
+    runner's writer thread; the file only appears once it's complete, so resuming never
+    mistakes a half-written batch for a finished one.
+    """
+    json_object = NeuronpediaConverter.convert_to_np_json(
+        model, feature_data, cfg, vocab_dict
+    )
+    tmp_file = output_file.with_name(f"{output_file.name}.tmp")
+    # writing the whole string at once encodes a second full-size copy of it; slices
+    # keep that copy small. The string itself stays on the C json encoder's fast path.
+    with open(tmp_file, "w", buffering=JSON_WRITE_CHUNK_CHARS) as f:
+        for start in range(0, len(json_object), JSON_WRITE_CHUNK_CHARS):
+            f.write(json_object[start : start + JSON_WRITE_CHUNK_CHARS])
+    os.replace(tmp_file, output_file)
+    print(f"Output written to {output_file}")
 
 
 class NeuronpediaRunner:
@@ -75,7 +163,6 @@ class NeuronpediaRunner:
             self.cfg.sae_device = self.cfg.sae_device or "mps"
             self.cfg.model_device = self.cfg.model_device or "mps"
             self.cfg.model_n_devices = self.cfg.model_n_devices or 1
-            self.cfg.activation_store_device = self.cfg.activation_store_device or "mps"
         elif torch.cuda.is_available():
             device_count = torch.cuda.device_count()
             if device_count > 1:
@@ -87,15 +174,18 @@ class NeuronpediaRunner:
                 self.cfg.sae_device = self.cfg.sae_device or "cuda"
             self.cfg.model_device = self.cfg.model_device or "cuda"
             self.cfg.sae_device = self.cfg.sae_device or "cuda"
-            self.cfg.activation_store_device = (
-                self.cfg.activation_store_device or "cuda"
-            )
         else:
             self.cfg.sae_device = self.cfg.sae_device or "cpu"
             self.cfg.model_device = self.cfg.model_device or "cpu"
             self.cfg.model_n_devices = self.cfg.model_n_devices or 1
-            self.cfg.activation_store_device = self.cfg.activation_store_device or "cpu"
 
+        # parse the device strings once; the cfg keeps the string forms for serialization
+        self._sae_device_t = torch.device(
+            self.cfg.sae_device or DEFAULT_FALLBACK_DEVICE
+        )
+        self._model_device_t = torch.device(
+            self.cfg.model_device or DEFAULT_FALLBACK_DEVICE
+        )
         # Initialize SAE, defaulting to SAE dtype unless we override
         if self.cfg.from_local_sae:
             self.sae = SAE.load_from_disk(  # type: ignore
@@ -109,17 +199,15 @@ class NeuronpediaRunner:
                 sae_id=self.cfg.sae_path,
                 device=self.cfg.sae_device or DEFAULT_FALLBACK_DEVICE,
             )
-            if self.cfg.sae_dtype != "":
-                if self.cfg.sae_dtype == "float16":
-                    self.sae.to(dtype=torch.float16)
-                elif self.cfg.sae_dtype == "float32":
-                    self.sae.to(dtype=torch.float32)
-                elif self.cfg.sae_dtype == "bfloat16":
-                    self.sae.to(dtype=torch.bfloat16)
-                else:
-                    raise ValueError(
-                        f"Unsupported dtype: {self.cfg.sae_dtype}, we support float16, float32, bfloat16"
-                    )
+            # local SAEs hand any dtype string to load_from_disk; only this override
+            # path is limited to SUPPORTED_DTYPE_OVERRIDES
+            override_dtype = _resolve_dtype(self.cfg.sae_dtype)
+            if override_dtype is not None and any(
+                param.dtype != override_dtype for param in self.sae.parameters()
+            ):
+                self.sae.to(dtype=override_dtype)
+        # the loaded SAE is already in the override dtype, if there was one
+        self._sae_torch_dtype = self.sae.dtype
 
         # If we didn't override dtype, then use the SAE's dtype
         if self.cfg.sae_dtype == "":
@@ -131,8 +219,9 @@ class NeuronpediaRunner:
         if self.cfg.model_dtype == "":
             self.cfg.model_dtype = "float32"
 
-        # double sure this works
-        self.sae.to(self.cfg.sae_device or DEFAULT_FALLBACK_DEVICE)
+        # double sure this works, but skip the copy if the loader already placed it
+        if not _module_is_on(self.sae, self._sae_device_t):
+            self.sae.to(self._sae_device_t)
         self.sae.cfg.device = self.cfg.sae_device or DEFAULT_FALLBACK_DEVICE
 
         if self.cfg.huggingface_dataset_path == "":
@@ -153,12 +242,14 @@ class NeuronpediaRunner:
 
         # get the sae's cfg and check if it has from pretrained kwargs
         # with open(f"{self.cfg.sae_path}/cfg.json", "r") as f:
-        sae_cfg_json = self.sae.cfg.to_dict()
-        sae_from_pretrained_kwargs = sae_cfg_json.get(
+        # kept for the wandb config in run() so the SAE config is only walked once
+        self._sae_cfg_dict = self.sae.cfg.to_dict()
+        sae_from_pretrained_kwargs = self._sae_cfg_dict.get(
             "model_from_pretrained_kwargs", {}
         )
-        print("SAE Config on disk:")
-        print(json.dumps(sae_cfg_json, indent=2))
+        if self.cfg.verbose:
+            print("SAE Config on disk:")
+            print(json.dumps(self._sae_cfg_dict, indent=2))
         if sae_from_pretrained_kwargs != {}:
             print("SAE has from_pretrained_kwargs", sae_from_pretrained_kwargs)
         else:
@@ -168,9 +259,24 @@ class NeuronpediaRunner:
 
         self.sae.cfg.dataset_path = self.cfg.huggingface_dataset_path
         self.sae.cfg.context_size = self.cfg.n_tokens_in_prompt
+        self._sae_cfg_dict.update(
+            dataset_path=self.sae.cfg.dataset_path,
+            context_size=self.sae.cfg.context_size,
+        )
 
         self.sae.fold_W_dec_norm()
 
+        if self.cfg.use_torch_compile:
+            if self._sae_device_t.type == "cuda":
+                # SaeVisRunner calls encode once per token minibatch with a fixed shape.
+                # Default mode rather than "reduce-overhead": FeatureMaskingContext swaps
+                # the SAE parameters per batch, which CUDA graphs would not pick up.
+                self.sae.encode = torch.compile(self.sae.encode)
+            else:
+                print(
+                    f"Warning: use_torch_compile is only supported on CUDA, not {self._sae_device_t.type}. Skipping."
+                )
+
         print(f"SAE DType: {self.cfg.sae_dtype}")
         print(f"Model DType: {self.cfg.model_dtype}")
 
@@ -183,13 +289,18 @@ class NeuronpediaRunner:
         hf_model = None
         if self.cfg.hf_model_path:
             print(f"Loading custom HF model from: {self.cfg.hf_model_path}")
+            # load straight into the target dtype rather than fp32 followed by a cast
+            # in HookedTransformer; low_cpu_mem_usage skips the random init
             hf_model = AutoModelForCausalLM.from_pretrained(
                 self.cfg.hf_model_path,
+                # any dtype string HookedTransformer accepts; unknown ones keep the default
+                torch_dtype=DTYPES.get(self.cfg.model_dtype),
+                low_cpu_mem_usage=True,
             )
 
         self.model = HookedTransformer.from_pretrained(
             model_name=self.model_id,
-            device=self.cfg.model_device,
+            device=self.cfg.model_device,  # TL keeps this as a str in its cfg
             n_devices=self.cfg.model_n_devices or 1,
             hf_model=hf_model,  # Pass the custom model if provided
             **sae_from_pretrained_kwargs,
@@ -197,13 +308,24 @@ class NeuronpediaRunner:
         )
 
         # Initialize Activations Store
+        # its buffer only feeds token generation, so keeping it off the accelerator
+        # leaves that memory for the model and SAE at no throughput cost
+        self.cfg.activation_store_device = self.cfg.activation_store_device or "cpu"
+        if (
+            self.cfg.activation_store_device != "cpu"
+            and torch.device(self.cfg.activation_store_device) == self._model_device_t
+        ):
+            print(
+                f"Warning: activation_store_device is set to the model device ({self.cfg.activation_store_device}); "
+                "the activation buffer will compete with the model for device memory."
+            )
         self.activations_store = ActivationsStore.from_sae(
             model=self.model,
             sae=self.sae,
             streaming=True,
             store_batch_size_prompts=8,  # these don't matter
             n_batches_in_buffer=16,  # these don't matter
-            device=self.cfg.activation_store_device or "cpu",
+            device=self.cfg.activation_store_device,
         )
         self.cached_activations_dir = Path(
             f"./cached_activations/{self.model_id}_{self.cfg.sae_set}_{self.sae.cfg.hook_name}_{self.sae.cfg.d_sae}width_{self.cfg.n_prompts_total}prompts"
@@ -214,15 +336,32 @@ class NeuronpediaRunner:
         if self.cfg.n_tokens_in_prompt is not None:
             self.activations_store.context_size = self.cfg.n_tokens_in_prompt
 
+        # tokens only depend on the tokenizer, dataset, bos handling, shuffling and shape,
+        # so SAEs on the same model share them instead of re-tokenizing per output dir
+        tokens_cache_name = "_".join(
+            re.sub(r"[^\w.-]", "_", part)
+            for part in (self.model_id, self.cfg.huggingface_dataset_path)
+        )
+        bos_suffix = "" if self.sae.cfg.prepend_bos else "_nobos"
+        shuffle_suffix = "_shuffled" if self.cfg.shuffle_tokens else ""
+        self._tokens_cache_name = f"{tokens_cache_name}_{self.cfg.n_prompts_total}prompts_{self.activations_store.context_size}tokens{bos_suffix}{shuffle_suffix}"
+
         # if we have additional info, add it to the outputs subdir
         self.np_sae_id_suffix = self.cfg.np_sae_id_suffix
 
-        if not os.path.exists(cfg.outputs_dir):
-            os.makedirs(cfg.outputs_dir)
         self.cfg.outputs_dir = self.create_output_directory()
 
         self.vocab_dict = self.get_vocab_dict()
 
+    @property
+    def outputs_dir(self) -> Path:
+        # cfg keeps a str so run_settings.json stays serializable
+        return Path(self.cfg.outputs_dir)
+
+    @property
+    def cached_tokens_dir(self) -> Path:
+        return Path(self.cfg.tokens_cache_dir) / self._tokens_cache_name
+
     def create_output_directory(self) -> str:
         """
         Creates the output directory for storing generated features.
@@ -241,35 +380,51 @@ class NeuronpediaRunner:
         outputs_dir.mkdir(parents=True, exist_ok=True)
         return str(outputs_dir)
 
-    def hash_tensor(self, tensor: torch.Tensor) -> Tuple[int, ...]:
-        return tuple(tensor.cpu().numpy().flatten().tolist())
-
     def generate_tokens(
         self,
         activations_store: ActivationsStore,
         n_prompts: int = 4096 * 6,
     ) -> torch.Tensor:
-        all_tokens_list = []
-        unique_sequences: Set[Tuple[int, ...]] = set()
-        pbar = tqdm(range(n_prompts // activations_store.store_batch_size_prompts))
+        """
+        Streams batches from the activations store until we have `n_prompts` unique
+        sequences.
+        """
+        batch_size = activations_store.store_batch_size_prompts
+        # unique sequences are written straight into one preallocated buffer
+        all_tokens = torch.empty(
+            (n_prompts, activations_store.context_size), dtype=torch.long
+        )
+        n_unique = 0
+        seen_fingerprints: torch.Tensor | None = None
+        pbar = tqdm(range(n_prompts // batch_size))
 
         for _ in pbar:
+            if n_unique >= n_prompts:
+                break
+
             batch_tokens = activations_store.get_batch_tokens()
             if self.cfg.shuffle_tokens:
                 batch_tokens = batch_tokens[torch.randperm(batch_tokens.shape[0])]
 
-            # Check for duplicates and only add unique sequences
-            for seq in batch_tokens:
-                seq_hash = self.hash_tensor(seq)
-                if seq_hash not in unique_sequences:
-                    unique_sequences.add(seq_hash)
-                    all_tokens_list.append(seq.unsqueeze(0))
-
-            # Early exit if we've collected enough unique sequences
-            if len(all_tokens_list) >= n_prompts:
-                break
+            # Check for duplicates and only add unique sequences. Rows are compared by
+            # fingerprint, on device (except MPS, see has_duplicate_rows).
+            fingerprints = row_fingerprints(
+                batch_tokens.cpu()
+                if batch_tokens.device.type == "mps"
+                else batch_tokens
+            )
+            if seen_fingerprints is None:
+                seen_fingerprints = fingerprints[:0]
+            is_new = first_occurrence_mask(fingerprints) & ~torch.isin(
+                fingerprints, seen_fingerprints
+            )
+            seen_fingerprints = torch.cat([seen_fingerprints, fingerprints[is_new]])
+            new_tokens = batch_tokens[is_new.to(batch_tokens.device)]
+            n_take = min(new_tokens.shape[0], n_prompts - n_unique)
+            all_tokens[n_unique : n_unique + n_take] = new_tokens[:n_take]
+            n_unique += n_take
 
-        all_tokens = torch.cat(all_tokens_list, dim=0)[:n_prompts]
+        all_tokens = all_tokens[:n_unique]
         if self.cfg.shuffle_tokens:
             all_tokens = all_tokens[torch.randperm(all_tokens.shape[0])]
 
@@ -277,42 +432,54 @@ class NeuronpediaRunner:
 
     def add_prefix_suffix_to_tokens(self, tokens: torch.Tensor) -> torch.Tensor:
         original_length = tokens.shape[1]
-        bos_tokens = tokens[:, 0]  # might not be if sae.cfg.prepend_bos is False
-        prefix_length = len(self.cfg.prefix_tokens) if self.cfg.prefix_tokens else 0
-        suffix_length = len(self.cfg.suffix_tokens) if self.cfg.suffix_tokens else 0
+        prefix_tokens = self.cfg.prefix_tokens or []
+        suffix_tokens = self.cfg.suffix_tokens or []
 
-        # return tokens if no prefix or suffix
-        if self.cfg.prefix_tokens is None and self.cfg.suffix_tokens is None:
+        # return tokens if no prefix or suffix (empty lists would just copy them)
+        if not prefix_tokens and not suffix_tokens:
             return tokens
 
         # Calculate how many tokens to keep from the original
-        keep_length = original_length - prefix_length - suffix_length
+        keep_length = original_length - len(prefix_tokens) - len(suffix_tokens)
 
         if keep_length <= 0:
             raise ValueError("Prefix and suffix are too long for the given tokens.")
 
-        # Trim original tokens
-        tokens = tokens[:, : keep_length - self.sae.cfg.prepend_bos]
-
-        if self.cfg.prefix_tokens:
-            prefix = torch.tensor(self.cfg.prefix_tokens).to(tokens.device)
-            prefix_repeated = prefix.unsqueeze(0).repeat(tokens.shape[0], 1)
-            # if sae.cfg.prepend_bos, then add that before the suffix
-            if self.sae.cfg.prepend_bos:
-                bos = bos_tokens.unsqueeze(1)
-                prefix_repeated = torch.cat([bos, prefix_repeated], dim=1)
-            tokens = torch.cat([prefix_repeated, tokens], dim=1)
-
-        if self.cfg.suffix_tokens:
-            suffix = torch.tensor(self.cfg.suffix_tokens).to(tokens.device)
-            suffix_repeated = suffix.unsqueeze(0).repeat(tokens.shape[0], 1)
-            tokens = torch.cat([tokens, suffix_repeated], dim=1)
-
-        # assert length hasn't changed
-        assert tokens.shape[1] == original_length
-        return tokens
+        # if sae.cfg.prepend_bos, the bos goes before the prefix and takes one of the kept slots
+        # (tokens[:, 0] might not be a bos if sae.cfg.prepend_bos is False)
+        bos_length = 1 if prefix_tokens and self.sae.cfg.prepend_bos else 0
+        body_length = keep_length - bos_length
+
+        # fill one output buffer slice by slice; prefix / suffix broadcast over the batch
+        out = torch.empty_like(tokens)
+        pos = 0
+        if bos_length:
+            out[:, 0] = tokens[:, 0]
+            pos += 1
+        if prefix_tokens:
+            out[:, pos : pos + len(prefix_tokens)] = torch.tensor(
+                prefix_tokens, dtype=tokens.dtype, device=tokens.device
+            )
+            pos += len(prefix_tokens)
+        out[:, pos : pos + body_length] = tokens[:, :body_length]
+        pos += body_length
+        if suffix_tokens:
+            out[:, pos:] = torch.tensor(
+                suffix_tokens, dtype=tokens.dtype, device=tokens.device
+            )
+
+        return out
 
     def get_alive_features(self) -> list[int]:
+        # reuse the selection from an earlier (partial) run so resumed batches line up
+        alive_features_path = self.outputs_dir / ALIVE_FEATURES_FILE
+        if alive_features_path.is_file():
+            return np.load(alive_features_path).tolist()
+        target_feature_indexes = self._select_alive_features()
+        np.save(alive_features_path, np.asarray(target_feature_indexes, dtype=np.int32))
+        return target_feature_indexes
+
+    def _select_alive_features(self) -> list[int]:
         # skip sparsity
         target_feature_indexes = list(range(self.sae.cfg.d_sae))
         print("Warning: Sparsity option is not implemented, running all features.")
@@ -335,77 +502,134 @@ class NeuronpediaRunner:
         #     # )
         return target_feature_indexes
 
-    def get_feature_batches(self):
-        # divide into batches
-        feature_idx = torch.tensor(self.target_feature_indexes)
-        n_subarrays = np.ceil(len(feature_idx) / self.cfg.n_features_at_a_time).astype(
-            int
-        )
-        feature_idx = np.array_split(feature_idx, n_subarrays)
-        feature_idx = [x.tolist() for x in feature_idx]
+    def get_feature_batches(self) -> list[list[int]]:
+        # divide into batches, sized like np.array_split so batch files from
+        # earlier runs keep the same feature ranges: the first `n_larger` get one extra
+        idxs = self.target_feature_indexes
+        n_batches = -(-len(idxs) // self.cfg.n_features_at_a_time)
+        base_size, n_larger = divmod(len(idxs), n_batches)
+        feature_idx = []
+        start = 0
+        for i in range(n_batches):
+            end = start + base_size + (i < n_larger)
+            feature_idx.append(idxs[start:end])
+            start = end
 
         return feature_idx
 
     def record_skipped_features(self):
         # write dead into file so we can create them as dead in Neuronpedia
-        skipped_indexes = set(range(self.n_features)) - set(self.target_feature_indexes)
-        skipped_indexes_json = json.dumps(
-            {
-                "model_id": self.model_id,
-                "layer": str(self.layer),
-                "sae_set": self.cfg.sae_set,
-                "log_sparsity": self.cfg.sparsity_threshold,
-                "skipped_indexes": list(skipped_indexes),
-            }
-        )
-        with open(f"{self.cfg.outputs_dir}/skipped_indexes.json", "w") as f:
-            f.write(skipped_indexes_json)
+        if len(self.target_feature_indexes) == self.n_features:
+            skipped_indexes: list[int] = []
+        else:
+            # boolean mask instead of two O(d_sae) Python sets
+            skipped_mask = np.ones(self.n_features, dtype=bool)
+            skipped_mask[np.asarray(self.target_feature_indexes, dtype=np.int64)] = 0
+            skipped_indexes = np.flatnonzero(skipped_mask).tolist()
+        with open(self.outputs_dir / "skipped_indexes.json", "w") as f:
+            json.dump(
+                {
+                    "model_id": self.model_id,
+                    "layer": str(self.layer),
+                    "sae_set": self.cfg.sae_set,
+                    "log_sparsity": self.cfg.sparsity_threshold,
+                    "skipped_indexes": skipped_indexes,
+                },
+                f,
+            )
 
     def get_tokens(self):
-        tokens_file = f"{self.cfg.outputs_dir}/tokens_{self.cfg.n_prompts_total}.pt"
-        if os.path.isfile(tokens_file):
+        outputs_dir = self.outputs_dir
+        # runs from before the switch to Arrow datasets saved a single .pt file
+        legacy_tokens_file = outputs_dir / f"tokens_{self.cfg.n_prompts_total}.pt"
+        if legacy_tokens_file.is_file():
             print("Tokens exist, loading them.")
-            tokens = torch.load(tokens_file)
+            tokens = torch.load(legacy_tokens_file, weights_only=True)
+            assert not has_duplicate_rows(tokens), "Duplicate rows in tokens"
+        elif self.cached_tokens_dir.is_dir():
+            print(f"Loading cached tokens from {self.cached_tokens_dir}")
+            tokens = _load_tokens(self.cached_tokens_dir)
+            assert not has_duplicate_rows(tokens), "Duplicate rows in tokens"
         else:
             print("Tokens don't exist, making them.")
+            # generate_tokens already drops duplicates
             tokens = self.generate_tokens(
-                self.activations_store,
-                self.cfg.n_prompts_total,
-            )
-            torch.save(
-                tokens,
-                tokens_file,
+                self.activations_store, self.cfg.n_prompts_total
             )
+            self.cached_tokens_dir.parent.mkdir(parents=True, exist_ok=True)
+            if not _save_tokens(tokens, self.cached_tokens_dir):
+                # another run cached its tokens first, use those so all runs agree
+                print(f"Loading cached tokens from {self.cached_tokens_dir}")
+                tokens = _load_tokens(self.cached_tokens_dir)
 
-        assert not has_duplicate_rows(tokens), "Duplicate rows in tokens"
-
+        self._check_tokens_fingerprint(tokens)
         return tokens
 
+    def _check_tokens_fingerprint(self, tokens: torch.Tensor) -> None:
+        """
+        Pin the tokens to the outputs dir, so a resumed run whose shared cache was cleared
+        or pointed elsewhere can't silently mix batches built from different tokens.
+        """
+        fingerprint_file = self.outputs_dir / TOKENS_FINGERPRINT_FILE
+        fingerprint = _tokens_fingerprint(tokens)
+        if not fingerprint_file.is_file():
+            fingerprint_file.write_text(fingerprint)
+        elif fingerprint_file.read_text().strip() != fingerprint:
+            raise ValueError(
+                f"Tokens from {self.cached_tokens_dir} don't match the tokens the batches "
+                f"in {self.outputs_dir} were generated from. Restore the original tokens "
+                "cache or use a new outputs dir."
+            )
+
     def get_vocab_dict(self) -> Dict[int, str]:
         # get vocab
         vocab_dict: dict = self.model.tokenizer.vocab  # type: ignore
-        new_vocab_dict = {}
         # Replace substrings in the keys of vocab_dict using HTML_ANOMALIES
-        for k, v in vocab_dict.items():  # type: ignore
-            modified_key = k
-            for anomaly in HTML_ANOMALIES:
-                modified_key = modified_key.replace(anomaly, HTML_ANOMALIES[anomaly])
-            new_vocab_dict[v] = modified_key
-        vocab_dict = new_vocab_dict
+        vocab_dict = {v: clean_anomalies(k) for k, v in vocab_dict.items()}  # type: ignore
         # pad with blank tokens to the actual vocab size
-        for i in range(len(vocab_dict), self.model.cfg.d_vocab):
-            vocab_dict[i] = OUT_OF_RANGE_TOKEN
+        vocab_dict.update(
+            dict.fromkeys(
+                range(len(vocab_dict), self.model.cfg.d_vocab), OUT_OF_RANGE_TOKEN
+            )
+        )
         return vocab_dict
 
+    def _log_batches_to_wandb(self, last_batch: int, n_written: int) -> None:
+        # n_written is the running total of batch files written by this run
+        wandb.log(
+            {"batch": last_batch, "completed_batches": n_written},
+            step=last_batch,
+        )
+
+    @contextmanager
+    def _inference_ctx(self) -> Generator[None, None, None]:
+        """
+        Inference mode for the dashboard loop, plus autocast when the SAE and the model
+        share the same reduced precision dtype on CUDA. Anything else (full precision,
+        or e.g. an fp16 SAE on a bf16 model) is left untouched so no op gets recast.
+        """
+        use_autocast = (
+            self._sae_device_t.type == "cuda"
+            and self._sae_torch_dtype in REDUCED_PRECISION_DTYPES
+            and self._sae_torch_dtype == DTYPES.get(self.cfg.model_dtype)
+        )
+        with torch.inference_mode(), torch.autocast(
+            device_type=self._sae_device_t.type,
+            dtype=self._sae_torch_dtype,
+            enabled=use_autocast,
+        ):
+            yield
+
     # TODO: make this function simpler
     def run(self):
-        run_settings_path = self.cfg.outputs_dir + "/" + RUN_SETTINGS_FILE
+        outputs_dir = self.outputs_dir
+        run_settings_path = outputs_dir / RUN_SETTINGS_FILE
         run_settings = self.cfg.__dict__
         with open(run_settings_path, "w") as f:
             json.dump(run_settings, f, indent=4)
 
         wandb_cfg = self.cfg.__dict__
-        wandb_cfg["sae_cfg"] = self.sae.cfg.to_dict()
+        wandb_cfg["sae_cfg"] = self._sae_cfg_dict
 
         current_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         set_name = (
@@ -434,71 +658,92 @@ class NeuronpediaRunner:
 
         self.record_skipped_features()
         tokens = self.get_tokens()
-        tokens = self.add_prefix_suffix_to_tokens(tokens)
+        if self.cfg.prefix_tokens or self.cfg.suffix_tokens:
+            tokens = self.add_prefix_suffix_to_tokens(tokens)
 
         del self.activations_store
 
-        with torch.no_grad():
-            for feature_batch_count, features_to_process in tqdm(
-                enumerate(feature_idx)
-            ):
-                if feature_batch_count < self.cfg.start_batch:
-                    feature_batch_count = feature_batch_count + 1
-                    continue
-                if (
-                    self.cfg.end_batch is not None
-                    and feature_batch_count > self.cfg.end_batch
-                ):
-                    feature_batch_count = feature_batch_count + 1
-                    continue
-
-                output_file = f"{self.cfg.outputs_dir}/batch-{feature_batch_count}.json"
-                # if output_file exists, skip
-                if os.path.isfile(output_file):
-                    logline = f"\n++++++++++ Skipping Batch #{feature_batch_count} output. File exists: {output_file} ++++++++++\n"
-                    print(logline)
-                    continue
-
-                print(f"========== Running Batch #{feature_batch_count} ==========")
+        self.cfg.model_id = self.model_id
+        self.cfg.layer = self.layer
 
-                layout = SaeVisLayoutConfig(
-                    columns=[
-                        Column(
-                            SequencesConfig(
-                                stack_mode="stack-all",
-                                buffer=None,  # type: ignore
-                                compute_buffer=True,
-                                n_quantiles=self.cfg.n_quantiles,
-                                top_acts_group_size=self.cfg.top_acts_group_size,
-                                quantile_group_size=self.cfg.quantile_group_size,
-                            ),
-                            ActsHistogramConfig(),
-                            LogitsHistogramConfig(),
-                            LogitsTableConfig(),
-                            FeatureTablesConfig(n_rows=3),
-                        )
-                    ]
+        # everything except the feature list is the same for every batch
+        layout = SaeVisLayoutConfig(
+            columns=[
+                Column(
+                    SequencesConfig(
+                        stack_mode="stack-all",
+                        buffer=None,  # type: ignore
+                        compute_buffer=True,
+                        n_quantiles=self.cfg.n_quantiles,
+                        top_acts_group_size=self.cfg.top_acts_group_size,
+                        quantile_group_size=self.cfg.quantile_group_size,
+                    ),
+                    ActsHistogramConfig(),
+                    LogitsHistogramConfig(),
+                    LogitsTableConfig(),
+                    FeatureTablesConfig(n_rows=3),
                 )
+            ]
+        )
+        ignore_tokens = {
+            self.model.tokenizer.pad_token_id,  # type: ignore
+            self.model.tokenizer.bos_token_id,  # type: ignore
+            self.model.tokenizer.eos_token_id,  # type: ignore
+        }
+        base_vis_cfg_kwargs: dict[str, Any] = dict(
+            hook_point=self.sae.cfg.hook_name,
+            minibatch_size_features=self.cfg.n_features_at_a_time,
+            minibatch_size_tokens=self.cfg.n_prompts_in_forward_pass,
+            quantile_feature_batch_size=self.cfg.quantile_feature_batch_size,
+            verbose=True,
+            device=self.cfg.sae_device or DEFAULT_FALLBACK_DEVICE,
+            feature_centric_layout=layout,
+            perform_ablation_experiments=False,
+            dtype=self.cfg.sae_dtype,
+            cache_dir=self.cached_activations_dir,
+            ignore_tokens=ignore_tokens,
+            ignore_positions=self.cfg.ignore_positions or [],
+            use_dfa=self.cfg.use_dfa,
+        )
+
+        # one directory listing up front instead of a stat per batch, so a resumed run
+        # only iterates (and reports progress for) the batches still to do
+        existing_batches = {
+            int(m.group(1))
+            for name in os.listdir(outputs_dir)
+            if (m := re.fullmatch(r"batch-(\d+)\.json", name))
+        }
+        end_batch = None if self.cfg.end_batch is None else self.cfg.end_batch + 1
+        batches_in_range = feature_idx[self.cfg.start_batch : end_batch]
+        pending_batches = [
+            (batch_idx, features)
+            for batch_idx, features in enumerate(
+                batches_in_range, start=self.cfg.start_batch
+            )
+            if batch_idx not in existing_batches
+        ]
+        n_skipped = len(batches_in_range) - len(pending_batches)
+        if n_skipped:
+            print(
+                f"\n++++++++++ Skipping {n_skipped} batches, output files exist in {outputs_dir} ++++++++++\n"
+            )
+
+        # JSON conversion + writing runs on a background thread, overlapping the next
+        # batch's GPU work. A process pool would have to pickle the model and results.
+        # batches are only reported to wandb once their file has been written
+        pending_write: Future[None] | None = None
+        pending_batch = -1
+        n_written = 0
+        n_unlogged = 0
+        last_wandb_log = time.monotonic()
+        with ThreadPoolExecutor(max_workers=1) as writer, self._inference_ctx():
+            for feature_batch_count, features_to_process in tqdm(pending_batches):
+                output_file = outputs_dir / f"batch-{feature_batch_count}.json"
+
+                print(f"========== Running Batch #{feature_batch_count} ==========")
 
                 feature_vis_config_gpt = SaeVisConfig(
-                    hook_point=self.sae.cfg.hook_name,
-                    features=features_to_process,
-                    minibatch_size_features=self.cfg.n_features_at_a_time,
-                    minibatch_size_tokens=self.cfg.n_prompts_in_forward_pass,
-                    quantile_feature_batch_size=self.cfg.quantile_feature_batch_size,
-                    verbose=True,
-                    device=self.cfg.sae_device or DEFAULT_FALLBACK_DEVICE,
-                    feature_centric_layout=layout,
-                    perform_ablation_experiments=False,
-                    dtype=self.cfg.sae_dtype,
-                    cache_dir=self.cached_activations_dir,
-                    ignore_tokens={
-                        self.model.tokenizer.pad_token_id,  # type: ignore
-                        self.model.tokenizer.bos_token_id,  # type: ignore
-                        self.model.tokenizer.eos_token_id,  # type: ignore
-                    },  # type: ignore
-                    ignore_positions=self.cfg.ignore_positions or [],
-                    use_dfa=self.cfg.use_dfa,
+                    **base_vis_cfg_kwargs, features=features_to_process
                 )
 
                 feature_data = SaeVisRunner(feature_vis_config_gpt).run(
@@ -528,34 +773,48 @@ class NeuronpediaRunner:
                 #             },
                 #             step=feature_batch_count,
                 #         )
-                self.cfg.model_id = self.model_id
-                self.cfg.layer = self.layer
-                json_object = NeuronpediaConverter.convert_to_np_json(
-                    self.model, feature_data, self.cfg, self.vocab_dict
-                )
-                with open(
+                # keep at most one batch waiting on the writer, to bound memory
+                if pending_write is not None:
+                    pending_write.result()
+                    n_written += 1
+                    n_unlogged += 1
+                    if self.cfg.use_wandb and (
+                        n_unlogged >= WANDB_LOG_EVERY_BATCHES
+                        or time.monotonic() - last_wandb_log >= WANDB_LOG_EVERY_SECONDS
+                    ):
+                        self._log_batches_to_wandb(pending_batch, n_written)
+                        n_unlogged = 0
+                        last_wandb_log = time.monotonic()
+                pending_write = writer.submit(
+                    _write_np_json,
+                    self.model,
+                    feature_data,
+                    self.cfg,
+                    self.vocab_dict,
                     output_file,
-                    "w",
-                ) as f:
-                    f.write(json_object)
-                print(f"Output written to {output_file}")
-
-                logline = f"\n========== Completed Batch #{feature_batch_count} output: {output_file} ==========\n"
-                if self.cfg.use_wandb:
-                    wandb.log(
-                        {"batch": feature_batch_count},
-                        step=feature_batch_count,
-                    )
+                )
+                pending_batch = feature_batch_count
+
                 # Clean up after each batch
+                # no empty_cache here: the caching allocator reuses these blocks
+                # for the next batch instead of going back to cudaMalloc
                 del feature_data
-                gc.collect()
-                if torch.cuda.is_available():
-                    torch.cuda.empty_cache()
+
+            if pending_write is not None:
+                pending_write.result()
+                n_written += 1
+                n_unlogged += 1
         if self.cfg.use_wandb:
+            if n_unlogged:
+                self._log_batches_to_wandb(pending_batch, n_written)
             wandb.sdk.finish()
 
 
 def main():
+    # read lazily on the first CUDA allocation, so this still applies after import;
+    # growable segments avoid fragmentation between the model and per-batch tensors
+    os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True")
+
     parser = argparse.ArgumentParser(description="Run Neuronpedia feature generation")
     parser.add_argument("--sae-set", required=True, help="SAE set name")
     parser.add_argument("--sae-path", required=True, help="Path to SAE")
@@ -577,6 +836,11 @@ def main():
     parser.add_argument(
         "--output-dir", default="neuronpedia_outputs/", help="Output directory"
     )
+    parser.add_argument(
+        "--tokens-cache-dir",
+        default="cached_tokens",
+        help="Directory for generated tokens shared between runs",
+    )
     parser.add_argument(
         "--sparsity-threshold", type=int, default=1, help="Sparsity threshold"
     )
@@ -608,6 +872,14 @@ def main():
     parser.add_argument(
         "--from-local-sae", action="store_true", help="Load SAE from local path"
     )
+    parser.add_argument(
+        "--use-torch-compile",
+        action="store_true",
+        help="Compile the SAE encoder with torch.compile (CUDA only)",
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="Print the full SAE config on startup"
+    )
     parser.add_argument(
         "--hf-model-path",
         type=str,
@@ -627,6 +899,7 @@ def main():
         sae_dtype=args.sae_dtype,
         model_dtype=args.model_dtype,
         outputs_dir=args.output_dir,
+        tokens_cache_dir=args.tokens_cache_dir,
         sparsity_threshold=args.sparsity_threshold,
         n_prompts_total=args.n_prompts,
         n_tokens_in_prompt=args.n_tokens_in_prompt,
@@ -635,6 +908,8 @@ def main():
         start_batch=args.start_batch,
         end_batch=args.end_batch,
         use_wandb=args.use_wandb,
+        use_torch_compile=args.use_torch_compile,
+        verbose=args.verbose,
         hf_model_path=args.hf_model_path,
     )
 
@@ -43,12 +43,17 @@ class NeuronpediaRunnerConfig:
     layer: Optional[int] = None
 
     sae_device: str | None = None
-    activation_store_device: str | None = None
+    # the activation buffer is only used for token generation, keep it off the GPU
+    activation_store_device: str | None = "cpu"
     model_device: str | None = None
     model_n_devices: int | None = None
     use_wandb: bool = False
+    use_torch_compile: bool = False  # compile the SAE encoder, CUDA only
+    verbose: bool = False  # print the full SAE config on startup
 
     shuffle_tokens: bool = True
+    # generated tokens are cached here and shared by runs with the same model/dataset
+    tokens_cache_dir: str = "cached_tokens"
     prefix_tokens: Optional[List[int]] = None
     suffix_tokens: Optional[List[int]] = None
     ignore_positions: Optional[List[int]] = None
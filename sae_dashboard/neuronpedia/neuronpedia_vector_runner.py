@@ -10,7 +10,6 @@ import numpy as np
 import torch
 import wandb
 import wandb.sdk
-from matplotlib import colors
 from sae_lens.training.activations_store import ActivationsStore
 from tqdm import tqdm
 from transformer_lens import HookedTransformer
@@ -26,7 +25,10 @@ from sae_dashboard.components_config import (
 
 # from sae_dashboard.data_writing_fns import save_feature_centric_vis
 from sae_dashboard.layout import SaeVisLayoutConfig
-from sae_dashboard.neuronpedia.neuronpedia_converter import NeuronpediaConverter
+from sae_dashboard.neuronpedia.neuronpedia_converter import (
+    NeuronpediaConverter,
+    clean_anomalies,
+)
 from sae_dashboard.neuronpedia.neuronpedia_runner_config import (
     NeuronpediaVectorRunnerConfig,
 )
@@ -40,27 +42,9 @@ os.environ["TOKENIZERS_PARALLELISM"] = "false"
 RUN_SETTINGS_FILE = "run_settings.json"
 OUT_OF_RANGE_TOKEN = "<|outofrange|>"
 
-BG_COLOR_MAP = colors.LinearSegmentedColormap.from_list(
-    "bg_color_map", ["white", "darkorange"]
-)
-
 
 DEFAULT_FALLBACK_DEVICE = "cpu"
 
-# TODO: add more anomalies here
-HTML_ANOMALIES = {
-    "âĢĶ": "—",
-    "âĢĵ": "–",
-    "âĢľ": "“",
-    "âĢĿ": "”",
-    "âĢĺ": "‘",
-    "âĢĻ": "’",
-    "âĢĭ": " ",  # TODO: this is actually zero width space
-    "Ġ": " ",
-    "Ċ": "\n",
-    "ĉ": "\t",
-}
-
 
 class NeuronpediaVectorRunner:
     def __init__(
@@ -347,7 +331,7 @@ class NeuronpediaVectorRunner:
         tokens_file = f"{self.cfg.outputs_dir}/tokens_{self.cfg.n_prompts_total}.pt"
         if os.path.isfile(tokens_file):
             print("Tokens exist, loading them.")
-            tokens = torch.load(tokens_file)
+            tokens = torch.load(tokens_file, weights_only=True)
         else:
             print("Tokens don't exist, making them.")
             tokens = self.generate_tokens(
@@ -366,17 +350,14 @@ class NeuronpediaVectorRunner:
     def get_vocab_dict(self) -> Dict[int, str]:
         # get vocab
         vocab_dict = self.model.tokenizer.vocab  # type: ignore
-        new_vocab_dict = {}
         # Replace substrings in the keys of vocab_dict using HTML_ANOMALIES
-        for k, v in vocab_dict.items():  # type: ignore
-            modified_key = k
-            for anomaly in HTML_ANOMALIES:
-                modified_key = modified_key.replace(anomaly, HTML_ANOMALIES[anomaly])
-            new_vocab_dict[v] = modified_key
-        vocab_dict = new_vocab_dict
+        vocab_dict = {v: clean_anomalies(k) for k, v in vocab_dict.items()}  # type: ignore
         # pad with blank tokens to the actual vocab size
-        for i in range(len(vocab_dict), self.model.cfg.d_vocab):
-            vocab_dict[i] = OUT_OF_RANGE_TOKEN
+        vocab_dict.update(
+            dict.fromkeys(
+                range(len(vocab_dict), self.model.cfg.d_vocab), OUT_OF_RANGE_TOKEN
+            )
+        )
         return vocab_dict
 
     # TODO: make this function simpler
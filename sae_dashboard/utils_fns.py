@@ -85,6 +85,53 @@ def has_duplicate_rows(tensor: torch.Tensor) -> bool:
         return bool(torch.any(counts > 1))
 
 
+def row_fingerprints(tensor: torch.Tensor, seed: int = 0) -> torch.Tensor:
+    """
+    Compute a 64-bit fingerprint for each row of a 2D integer tensor, on the tensor's device.
+
+    Equal rows always get equal fingerprints, and distinct rows collide with negligible
+    probability, so fingerprints can stand in for whole rows when deduplicating.
+
+    Args:
+        tensor (torch.Tensor): A 2D integer tensor, e.g. a batch of token sequences.
+        seed (int): Seed for the per-position weights. Fingerprints are only comparable
+            when computed with the same seed.
+
+    Returns:
+        torch.Tensor: An int64 tensor of shape [n_rows].
+
+    Raises:
+        ValueError: If the input tensor is not 2D.
+    """
+    if tensor.dim() != 2:
+        raise ValueError("Input tensor must be 2D")
+
+    generator = torch.Generator().manual_seed(seed)
+    weights = torch.randint(
+        1, 2**62, (tensor.shape[1],), generator=generator, dtype=torch.int64
+    ).to(tensor.device)
+    # int64 arithmetic wraps around, which is what we want for a hash
+    return (tensor.to(torch.int64) * weights).sum(dim=1)
+
+
+def first_occurrence_mask(values: torch.Tensor) -> torch.Tensor:
+    """
+    Boolean mask over a 1D tensor that is True at the first occurrence of each distinct value.
+    """
+    unique_values, inverse = torch.unique(values, return_inverse=True)
+    positions = torch.arange(values.shape[0], device=values.device)
+    # positions are int64 whatever the dtype of `values`
+    first_positions = torch.full(
+        (unique_values.numel(),),
+        values.shape[0],
+        dtype=torch.long,
+        device=values.device,
+    ).scatter_reduce(0, inverse, positions, reduce="amin")
+    mask = torch.zeros_like(values, dtype=torch.bool)
+    mask[first_positions] = True
+    return mask
+
+
 def get_device() -> torch.device:
     """
     Helper function to return the correct device (cuda, mps, or cpu).
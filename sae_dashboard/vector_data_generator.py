@@ -203,5 +203,5 @@ def save_tensor_dict_torch(tensor_dict: Dict[str, torch.Tensor], filename: Path)
 
 def load_tensor_dict_torch(filename: Path, device: str) -> Dict[str, torch.Tensor]:
     return torch.load(
-        filename, map_location=torch.device(device)
+        filename, map_location=torch.device(device), weights_only=True
     )  # Directly load to GPU
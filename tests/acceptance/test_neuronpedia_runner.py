@@ -1,5 +1,6 @@
 import json
 import os
+import shutil
 from typing import Type, TypeVar
 
 from sae_dashboard.neuronpedia.neuronpedia_dashboard import NeuronpediaDashboardBatch
@@ -31,6 +32,7 @@ def test_simple_neuronpedia_runner():
 
     NP_OUTPUT_FOLDER = "neuronpedia_outputs/test_simple"
     ACT_CACHE_FOLDER = "cached_activations"
+    TOKENS_CACHE_FOLDER = "cached_tokens"
     CORRECT_OUTPUTS_FOLDER = "tests/acceptance/test_simple"
     SAE_SET = "gpt2-small-res-jb"
     SAE_PATH = "blocks.0.hook_resid_pre"
@@ -40,6 +42,7 @@ def test_simple_neuronpedia_runner():
     # delete output files if present
     os.system(f"rm -rf {NP_OUTPUT_FOLDER}")
     os.system(f"rm -rf {ACT_CACHE_FOLDER}")
+    shutil.rmtree(TOKENS_CACHE_FOLDER, ignore_errors=True)
 
     # # we make two batches of 2 features each
     cfg = NeuronpediaRunnerConfig(
@@ -161,6 +164,7 @@ def test_simple_neuronpedia_runner_different_dtypes_sae_model():
 
     NP_OUTPUT_FOLDER = "neuronpedia_outputs/test_simple"
     ACT_CACHE_FOLDER = "cached_activations"
+    TOKENS_CACHE_FOLDER = "cached_tokens"
     CORRECT_OUTPUTS_FOLDER = "tests/acceptance/test_simple"
     SAE_SET = "gpt2-small-res-jb"
     SAE_PATH = "blocks.0.hook_resid_pre"
@@ -170,6 +174,7 @@ def test_simple_neuronpedia_runner_different_dtypes_sae_model():
     # delete output files if present
     os.system(f"rm -rf {NP_OUTPUT_FOLDER}")
     os.system(f"rm -rf {ACT_CACHE_FOLDER}")
+    shutil.rmtree(TOKENS_CACHE_FOLDER, ignore_errors=True)
 
     # # we make two batches of 2 features each
     cfg = NeuronpediaRunnerConfig(
@@ -288,6 +293,7 @@ def test_benchmark_neuronpedia_runner():
 def test_simple_neuronpedia_runner_hook_z_sae():
     NP_OUTPUT_FOLDER = "neuronpedia_outputs/test_attn"
     ACT_CACHE_FOLDER = "cached_activations"
+    TOKENS_CACHE_FOLDER = "cached_tokens"
     SAE_SET = "gpt2-small-hook-z-kk"
     SAE_PATH = "blocks.0.hook_z"
     NUM_FEATURES_PER_BATCH = 2
@@ -296,6 +302,7 @@ def test_simple_neuronpedia_runner_hook_z_sae():
     # delete output files if present
     os.system(f"rm -rf {NP_OUTPUT_FOLDER}")
     os.system(f"rm -rf {ACT_CACHE_FOLDER}")
+    shutil.rmtree(TOKENS_CACHE_FOLDER, ignore_errors=True)
 
     # # we make two batches of 2 features each
     cfg = NeuronpediaRunnerConfig(
@@ -323,6 +330,7 @@ def test_simple_neuronpedia_runner_hook_z_sae():
 def test_neuronpedia_runner_prefix_suffix_it_model():
     NP_OUTPUT_FOLDER = "neuronpedia_outputs/test_masking"
     ACT_CACHE_FOLDER = "cached_activations"
+    TOKENS_CACHE_FOLDER = "cached_tokens"
     SAE_SET = "gpt2-small-res-jb"
     SAE_PATH = "blocks.0.hook_resid_pre"
     NUM_FEATURES_PER_BATCH = 2
@@ -331,6 +339,7 @@ def test_neuronpedia_runner_prefix_suffix_it_model():
     # delete output files if present
     os.system(f"rm -rf {NP_OUTPUT_FOLDER}")
     os.system(f"rm -rf {ACT_CACHE_FOLDER}")
+    shutil.rmtree(TOKENS_CACHE_FOLDER, ignore_errors=True)
 
     # # we make two batches of 2 features each
     cfg = NeuronpediaRunnerConfig(
@@ -1,19 +1,31 @@
 from pathlib import Path
 
+import numpy as np
 import pytest
 import torch
 from transformer_lens import HookedTransformer
 
-from sae_dashboard.neuronpedia.neuronpedia_runner import NeuronpediaRunner
+from sae_dashboard.neuronpedia.neuronpedia_converter import (
+    HTML_ANOMALIES,
+    clean_anomalies,
+)
+from sae_dashboard.neuronpedia.neuronpedia_runner import (
+    ALIVE_FEATURES_FILE,
+    TOKENS_FINGERPRINT_FILE,
+    NeuronpediaRunner,
+    _load_tokens,
+    _save_tokens,
+)
 from sae_dashboard.neuronpedia.neuronpedia_runner_config import NeuronpediaRunnerConfig
 
 
 @pytest.fixture
-def runner_config() -> NeuronpediaRunnerConfig:
+def runner_config(tmp_path: Path) -> NeuronpediaRunnerConfig:
     return NeuronpediaRunnerConfig(
         sae_set="gpt2-small-res-jb",
         sae_path="blocks.5.hook_resid_pre",
-        outputs_dir="test_outputs",
+        outputs_dir=str(tmp_path / "test_outputs"),
+        tokens_cache_dir=str(tmp_path / "cached_tokens"),
         n_prompts_total=256,
         n_tokens_in_prompt=128,
         huggingface_dataset_path="monology/pile-uncopyrighted",
@@ -55,6 +67,42 @@ def test_get_tokens_no_duplicates(
     )
 
 
+def test_get_tokens_rejects_tokens_not_matching_outputs(
+    neuronpedia_runner: NeuronpediaRunner,
+) -> None:
+    tokens = neuronpedia_runner.get_tokens()
+    fingerprint_file = neuronpedia_runner.outputs_dir / TOKENS_FINGERPRINT_FILE
+    assert fingerprint_file.is_file()
+    assert torch.equal(neuronpedia_runner.get_tokens(), tokens)
+
+    fingerprint_file.write_text("0" * 64)
+    with pytest.raises(ValueError):
+        neuronpedia_runner.get_tokens()
+
+
+def test_get_alive_features_reuses_saved_selection(
+    neuronpedia_runner: NeuronpediaRunner, tmp_path: Path
+) -> None:
+    neuronpedia_runner.cfg.outputs_dir = str(tmp_path)
+    alive_features = neuronpedia_runner.get_alive_features()
+    assert alive_features == list(range(neuronpedia_runner.sae.cfg.d_sae))
+
+    # a saved selection takes precedence over recomputing it
+    np.save(tmp_path / ALIVE_FEATURES_FILE, np.array([1, 5, 7], dtype=np.int32))
+    assert neuronpedia_runner.get_alive_features() == [1, 5, 7]
+
+
+def test_get_feature_batches_matches_array_split(
+    neuronpedia_runner: NeuronpediaRunner,
+) -> None:
+    neuronpedia_runner.target_feature_indexes = list(range(10))
+    neuronpedia_runner.cfg.n_features_at_a_time = 3
+    feature_batches = neuronpedia_runner.get_feature_batches()
+    expected = np.array_split(np.arange(10), 4)
+    assert [len(batch) for batch in feature_batches] == [3, 3, 2, 2]
+    assert feature_batches == [batch.tolist() for batch in expected]
+
+
 def test_add_prefix_suffix_to_tokens(neuronpedia_runner: NeuronpediaRunner) -> None:
     # modify the config to add a prefix / suffix
     neuronpedia_runner.cfg.prefix_tokens = [101, 102, 103]  # Example prefix tokens
@@ -102,3 +150,44 @@ def test_add_prefix_suffix_to_tokens_prepend_bos_false(
             dtype=torch.int64,
         ),
     )
+
+
+def test_add_prefix_suffix_to_tokens_suffix_only(
+    neuronpedia_runner: NeuronpediaRunner,
+) -> None:
+    neuronpedia_runner.cfg.suffix_tokens = [104, 105, 106]
+
+    original_tokens = neuronpedia_runner.get_tokens()
+    tokens = neuronpedia_runner.add_prefix_suffix_to_tokens(original_tokens)
+
+    assert tokens.shape == original_tokens.shape
+    assert torch.equal(tokens[:, :-3], original_tokens[:, :-3])
+    assert torch.allclose(tokens[:, -3:].cpu(), torch.tensor([104, 105, 106]))
+
+
+def test_clean_anomalies_matches_sequential_replace() -> None:
+    token_strs = ["ĠtheĊ", "âĢľquotedâĢĿ", "ĉâĢĶĠ", "plain", ""]
+    for token_str in token_strs:
+        expected = token_str
+        for anomaly, replacement in HTML_ANOMALIES.items():
+            expected = expected.replace(anomaly, replacement)
+        assert clean_anomalies(token_str) == expected
+
+
+def test_save_tokens_round_trips(tmp_path: Path) -> None:
+    tokens = torch.randint(0, 50_000, (37, 16))
+    assert _save_tokens(tokens, tmp_path / "tokens")
+    loaded = _load_tokens(tmp_path / "tokens")
+    assert loaded.dtype == torch.long
+    assert torch.equal(loaded, tokens)
+    assert [p.name for p in tmp_path.iterdir()] == ["tokens"]
+
+
+def test_save_tokens_keeps_existing_dataset(tmp_path: Path) -> None:
+    tokens = torch.randint(0, 50_000, (37, 16))
+    assert _save_tokens(tokens, tmp_path / "tokens")
+
+    # a concurrent run that finishes second leaves the first run's tokens in place
+    assert not _save_tokens(torch.zeros_like(tokens), tmp_path / "tokens")
+    assert torch.equal(_load_tokens(tmp_path / "tokens"), tokens)
+    assert [p.name for p in tmp_path.iterdir()] == ["tokens"]
@@ -6,6 +6,8 @@ from sae_dashboard.utils_fns import (
     FeatureStatistics,
     RollingCorrCoef,
     TopK,
+    first_occurrence_mask,
+    row_fingerprints,
     sample_unique_indices,
 )
 
@@ -74,6 +76,31 @@ def test_sample_unique_indices():
     assert len(sampled_indices) == len(set(sampled_indices.tolist()))
 
 
+def test_row_fingerprints_equal_rows_match_and_distinct_rows_differ():
+    tokens = torch.randint(0, 50_000, (256, 128))
+    tokens[10] = tokens[3]
+    tokens[200] = tokens[3]
+
+    fingerprints = row_fingerprints(tokens)
+
+    assert fingerprints.shape == (256,)
+    assert fingerprints[10] == fingerprints[3] == fingerprints[200]
+    assert len(torch.unique(fingerprints)) == len(torch.unique(tokens, dim=0))
+
+
+def test_row_fingerprints_requires_2d():
+    with pytest.raises(ValueError):
+        row_fingerprints(torch.arange(10))
+
+
+def test_first_occurrence_mask():
+    values = torch.tensor([5, 3, 5, 7, 3, 3, 9])
+    expected = [True, True, False, True, False, False, True]
+    for dtype in (torch.int64, torch.int32, torch.float32):
+        mask = first_occurrence_mask(values.to(dtype))
+        assert mask.tolist() == expected
+
+
 def test_RollingCorrCoef_corrcoef():
     xs = torch.randn(10, 100)
     ys = torch.randn(10, 100)